@@ -0,0 +1,235 @@
+"""Schema normalizado e consultas dos stories capturados, com DuckDB.
+
+Cada fonte (Selenium, Apify) é normalizada para a tabela ``story_items``,
+com todos os tipos de sticker de cada item extraídos em uma única leitura
+com schema declarado (sem inferência). A view ``story_stickers`` expõe um
+sticker por linha e é a única consulta de processamento, comum às fontes.
+"""
+import os
+import tempfile
+import duckdb
+
+# Estrutura declarada de um item de story (mesmos campos no Selenium e no Apify).
+# Campos ausentes no JSON viram NULL, então o schema de saída é sempre o mesmo.
+ITEM_STORY = {
+    'pk': 'VARCHAR',
+    'taken_at': 'BIGINT',
+    'media_type': 'INTEGER',
+    'product_type': 'VARCHAR',
+    'story_link_stickers': [{'story_link': {'url': 'VARCHAR', 'display_url': 'VARCHAR'}}],
+    'story_bloks_stickers': [{'bloks_sticker': {'sticker_data': {'ig_mention': {'username': 'VARCHAR'}}}}],
+    'reel_mentions': [{'user': {'username': 'VARCHAR'}}],
+    'story_hashtags': [{'hashtag': {'name': 'VARCHAR'}}],
+    'story_product_items': [{'product_item': {'name': 'VARCHAR', 'merchant': {'username': 'VARCHAR'}}}],
+}
+
+# Schema normalizado comum a todas as fontes
+SCHEMA_STORY_ITEMS = {
+    'fonte': 'VARCHAR',
+    'username': 'VARCHAR',
+    'item_id': 'VARCHAR',
+    'taken_at': 'TIMESTAMPTZ',
+    'media_type': 'INTEGER',
+    'product_type': 'VARCHAR',
+    'link_urls': 'VARCHAR[]',
+    'link_dominios': 'VARCHAR[]',
+    'mencoes': 'VARCHAR[]',
+    'hashtags': 'VARCHAR[]',
+    'produtos': 'VARCHAR[]',
+}
+
+# Domínio do link do sticker -> origem
+DOMINIOS_ORIGEM = {
+    'amzlink.to': 'Amazon',
+    'mercadolivre.com': 'Mercado Livre',
+    'mercadolivre.com.br': 'Mercado Livre',
+    'produto.mercadolivre.com.br': 'Mercado Livre',
+    's.shopee.com.br': 'Shopee',
+    'minhaloja.natura.com': 'Natura',
+    'magazinevoce.com.br': 'Magazine Luiza',
+    'elausa.com.br': 'Ela Usa',
+    'epocacosmeticos.com.br': 'Época Cosméticos',
+    'natura.com.br': 'Natura',
+    'sminhaloja.natura.com': 'Natura',
+    'api.whatsapp.com': 'WhatsApp',
+    'google.com': 'Google',
+    'encurtador.com.br': 'Encurtador',
+    'tinyurl.com': 'Encurtador',
+    'br.shp.ee': 'Shopee',
+    'instagram.com': 'Instagram',
+}
+
+
+def sql_literal(valor):
+    """Escapa um texto como literal SQL."""
+    return "'" + str(valor).replace("'", "''") + "'"
+
+
+def tipo_sql(estrutura):
+    """Converte uma estrutura declarada (dict/list/str) no tipo SQL do DuckDB."""
+    if isinstance(estrutura, dict):
+        campos = ', '.join(f'"{nome}" {tipo_sql(tipo)}' for nome, tipo in estrutura.items())
+        return f'STRUCT({campos})'
+    if isinstance(estrutura, list):
+        return f'{tipo_sql(estrutura[0])}[]'
+    return estrutura
+
+
+def sql_colunas(colunas):
+    """Monta o parâmetro columns do read_json a partir do schema declarado."""
+    pares = ', '.join(f"{sql_literal(nome)}: {sql_literal(tipo_sql(tipo))}" for nome, tipo in colunas.items())
+    return '{' + pares + '}'
+
+
+def sql_origem(coluna):
+    """Monta o CASE que traduz o domínio do link para a origem."""
+    casos = '\n'.join(
+        f"    when {coluna} = {sql_literal(dominio)} then {sql_literal(origem)}"
+        for dominio, origem in DOMINIOS_ORIGEM.items()
+    )
+    return f"case\n{casos}\n    else null end"
+
+
+def sql_story_items(fonte):
+    """Monta o SELECT normalizado de uma fonte a partir do SQL dela,
+    que deve produzir as colunas (username, item)."""
+    return f'''
+with reels as (
+{fonte.sql_reels}
+)
+select
+{sql_literal(fonte.nome)} as fonte,
+username,
+item.pk as item_id,
+to_timestamp(item.taken_at) as taken_at,
+item.media_type as media_type,
+item.product_type as product_type,
+list_transform(coalesce(item.story_link_stickers, []), s -> s.story_link.url) as link_urls,
+list_transform(coalesce(item.story_link_stickers, []), s -> {fonte.sql_dominio_link}) as link_dominios,
+list_distinct(list_filter(list_concat(
+    list_transform(coalesce(item.story_bloks_stickers, []), s -> s.bloks_sticker.sticker_data.ig_mention.username),
+    list_transform(coalesce(item.reel_mentions, []), m -> m."user".username)
+), x -> x is not null)) as mencoes,
+list_filter(list_transform(coalesce(item.story_hashtags, []), h -> h.hashtag.name), x -> x is not null) as hashtags,
+list_filter(list_transform(coalesce(item.story_product_items, []),
+    p -> coalesce(p.product_item.merchant.username, p.product_item.name)), x -> x is not null) as produtos
+from reels
+'''
+
+SQL_STORY_STICKERS = f'''
+with stickers as (
+select fonte, username, item_id, taken_at, media_type, 'link' as tipo,
+unnest(link_urls) as valor, unnest(link_dominios) as dominio
+from story_items
+union all
+select fonte, username, item_id, taken_at, media_type, 'mencao' as tipo,
+unnest(mencoes) as valor, null as dominio
+from story_items
+union all
+select fonte, username, item_id, taken_at, media_type, 'hashtag' as tipo,
+unnest(hashtags) as valor, null as dominio
+from story_items
+union all
+select fonte, username, item_id, taken_at, media_type, 'produto' as tipo,
+unnest(produtos) as valor, null as dominio
+from story_items
+)
+select
+*,
+{sql_origem('dominio')} as origem
+from stickers
+'''
+
+
+def configurar_duckdb(con, memory_limit=None, threads=None, temp_directory=None):
+    """Limita memória e threads do DuckDB; o que não couber vai para o temp_directory."""
+    if memory_limit:
+        con.execute(f"set memory_limit = {sql_literal(memory_limit)}")
+    if threads:
+        con.execute(f"set threads = {int(threads)}")
+    if temp_directory:
+        con.execute(f"set temp_directory = {sql_literal(temp_directory)}")
+    # A ordem das linhas não importa para as saídas e mantê-la custa memória
+    con.execute("set preserve_insertion_order = false")
+
+
+def criar_tabelas(con):
+    """Cria a tabela story_items (schema normalizado) e a view story_stickers."""
+    colunas = ', '.join(f'{nome} {tipo}' for nome, tipo in SCHEMA_STORY_ITEMS.items())
+    con.execute(f'create or replace table story_items ({colunas})')
+    con.execute(f'create or replace view story_stickers as {SQL_STORY_STICKERS}')
+
+
+def _erro_curto(e):
+    return str(e).split('\n')[0][:200]
+
+
+def carregar_linhas(con, sql, arquivo):
+    """Carrega um arquivo NDJSON registro a registro, cada linha em um arquivo
+    temporário, para isolar os inválidos. Retorna [(linha, erro)] dos que falharam."""
+    erros = []
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'registro.json')
+        with open(arquivo, 'rb') as f:
+            for numero, linha in enumerate(f, 1):
+                if not linha.strip():
+                    continue
+                with open(caminho, 'wb') as registro:
+                    registro.write(linha)
+                try:
+                    con.execute(sql, [[caminho]])
+                except duckdb.Error as e:
+                    erros.append((numero, _erro_curto(e)))
+    return erros
+
+
+def carregar_fontes(con, fontes, quarentena=None):
+    """Normaliza os lotes de cada fonte para story_items.
+    Se um lote falhar, os arquivos são lidos um a um (os NDJSON, linha a linha)
+    e os inválidos são adicionados à lista quarentena (arquivo, fonte, linha,
+    erro) em vez de abortar. Retorna o número de itens carregados."""
+    criar_tabelas(con)
+    for fonte in fontes:
+        sql = f'insert into story_items {sql_story_items(fonte)}'
+        for lote in fonte.lotes():
+            try:
+                con.execute(sql, [lote])
+                continue
+            except duckdb.Error:
+                pass
+            for arquivo in lote:
+                if fonte.ndjson:
+                    erros = carregar_linhas(con, sql, arquivo)
+                else:
+                    try:
+                        con.execute(sql, [[arquivo]])
+                        erros = []
+                    except duckdb.Error as e:
+                        erros = [(None, _erro_curto(e))]
+                for linha, erro in erros:
+                    local = f"{arquivo}:{linha}" if linha else arquivo
+                    print(f"⚠️  Registro inválido ({fonte.nome}): {local} - {erro}")
+                    if quarentena is not None:
+                        quarentena.append({'arquivo': arquivo, 'fonte': fonte.nome, 'linha': linha, 'erro': erro})
+    return con.execute('select count(*) from story_items').fetchone()[0]
+
+
+def links_por_origem(con):
+    """Perfis com link para alguma origem conhecida (saída final do pipeline)."""
+    return con.sql('''
+    select distinct username, origem as origin, current_date as date
+    from story_stickers
+    where tipo = 'link' and origem is not null
+    ''')
+
+
+def stickers_por_perfil_dia(con, tipo=None):
+    """Contagem de stickers por perfil, dia, tipo e valor (ex.: marcas mencionadas)."""
+    filtro = f"where tipo = {sql_literal(tipo)}" if tipo else ''
+    return con.sql(f'''
+    select username, cast(taken_at as date) as dia, tipo, valor, count(*) as ocorrencias
+    from story_stickers
+    {filtro}
+    group by all
+    order by username, dia, tipo, ocorrencias desc
+    ''')
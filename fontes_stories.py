@@ -0,0 +1,119 @@
+"""Fontes de stories para o pipeline de processamento.
+
+Cada fonte entrega lotes de arquivos JSON e o SQL que transforma o formato
+bruto dela nas colunas (username, item), onde item segue ``ITEM_STORY``.
+A normalização e as consultas a partir daí são as de ``analise_stories``.
+"""
+import os
+import json
+import glob
+from abc import ABC, abstractmethod
+from analise_stories import ITEM_STORY, sql_colunas
+
+TAMANHO_LOTE = int(os.getenv('TAMANHO_LOTE', '500'))
+
+
+class FonteStories(ABC):
+    """Interface das fontes: nome, sql_reels, sql_dominio_link e lotes()."""
+
+    nome = None
+    # True se cada arquivo tem vários registros, um por linha (NDJSON)
+    ndjson = False
+    # SELECT que produz (username, item) a partir de read_json(?) sobre um lote
+    sql_reels = None
+    # Expressão que extrai o domínio de um link sticker (variável s)
+    sql_dominio_link = None
+
+    @abstractmethod
+    def lotes(self):
+        """Gera listas de caminhos de arquivos JSON a processar."""
+
+
+class FonteSelenium(FonteStories):
+    """Arquivos reels_media extraídos das capturas do Selenium."""
+
+    nome = 'selenium'
+    colunas = {
+        'user': {'username': 'VARCHAR'},
+        'items': [ITEM_STORY],
+    }
+    sql_reels = f'''
+select
+"user".username as username,
+unnest(items) as item
+from read_json(?, columns={sql_colunas(colunas)})
+-- O schema declarado transforma campos ausentes em NULL: registro sem user/items é inválido
+where case when "user".username is null or items is null
+    then error('registro sem user.username/items') else true end
+'''
+    # URL de redirecionamento: https://l.instagram.com/?u=https%3A%2F%2F<domínio>%2F...
+    sql_dominio_link = "replace(split(split(s.story_link.url, 'u=')[2], '%2F')[3], 'www.', '')"
+
+    def __init__(self, pasta, tamanho_lote=TAMANHO_LOTE):
+        self.pasta = pasta
+        self.tamanho_lote = tamanho_lote
+
+    def lotes(self):
+        arquivos = sorted(glob.glob(os.path.join(self.pasta, '*.json')))
+        for i in range(0, len(arquivos), self.tamanho_lote):
+            yield arquivos[i:i + self.tamanho_lote]
+
+
+class FonteApify(FonteStories):
+    """Itens do dataset de um run do Apify, gravados em lotes NDJSON."""
+
+    nome = 'apify'
+    # Um registro por linha: um lote inválido é recarregado linha a linha
+    ndjson = True
+    colunas = {
+        'requested': 'VARCHAR',
+        'stories': [ITEM_STORY],
+    }
+    sql_reels = f'''
+select
+requested as username,
+unnest(stories) as item
+from read_json(?, columns={sql_colunas(colunas)})
+where case when requested is null or stories is null
+    then error('registro sem requested/stories') else true end
+'''
+    # display_url sem esquema: <domínio>/...
+    sql_dominio_link = "replace(split(s.story_link.display_url, '/')[1], 'www.', '')"
+
+    def __init__(self, dataset_id, pasta, token=None, tamanho_lote=TAMANHO_LOTE):
+        self.dataset_id = dataset_id
+        self.pasta = pasta
+        self.token = token or os.getenv('APIFY_API_TOKEN')
+        self.tamanho_lote = tamanho_lote
+
+    def itens(self):
+        """Itera os itens do dataset no Apify."""
+        # Dependência opcional: só necessária quando a fonte Apify é usada
+        from apify_client import ApifyClient
+
+        return ApifyClient(self.token).dataset(self.dataset_id).iterate_items()
+
+    def _gravar_lote(self, numero, itens):
+        caminho = os.path.join(self.pasta, f'apify_{self.dataset_id}_{numero:05d}.ndjson')
+        with open(caminho, 'w', encoding='utf-8') as f:
+            for item in itens:
+                # 'No story available' quando o perfil não tem stories: vira lista vazia,
+                # para o restante do item ser validado pelo schema declarado como no Selenium
+                if isinstance(item, dict) and isinstance(item.get('stories'), str):
+                    item = {**item, 'stories': []}
+                f.write(json.dumps(item, ensure_ascii=False))
+                f.write('\n')
+        return caminho
+
+    def lotes(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        itens = []
+        numero = 0
+        for item in self.itens():
+            itens.append(item)
+            if len(itens) >= self.tamanho_lote:
+                yield [self._gravar_lote(numero, itens)]
+                itens = []
+                numero += 1
+        if itens:
+            yield [self._gravar_lote(numero, itens)]
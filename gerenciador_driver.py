@@ -0,0 +1,235 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+from contextlib import contextmanager
+import os
+import glob
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+# Tempo máximo de uma captura antes de o watchdog considerar o navegador travado
+DRIVER_TIMEOUT = int(os.getenv('DRIVER_TIMEOUT', '120'))
+
+
+def _pid_vivo(pid):
+    """Verifica se o PID existe (apenas POSIX)."""
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+
+
+def _descendentes(pid):
+    """Lista os PIDs descendentes de um processo via /proc (vazio fora do Linux)."""
+    if not os.path.isdir('/proc'):
+        return set()
+    filhos = {}
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat', 'r') as f:
+                # O nome do processo pode conter espaços: o ppid vem logo após o ')' final
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        filhos.setdefault(ppid, []).append(int(entrada))
+    encontrados = set()
+    pendentes = [pid]
+    while pendentes:
+        for filho in filhos.get(pendentes.pop(), []):
+            if filho not in encontrados:
+                encontrados.add(filho)
+                pendentes.append(filho)
+    return encontrados
+
+
+def encerrar_arvore(pid, pids_conhecidos=()):
+    """Encerra o ChromeDriver indicado e os Chrome filhos dele, sem tocar em outros processos."""
+    if os.name == 'nt':
+        subprocess.run(
+            ['taskkill', '/F', '/T', '/PID', str(pid)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return
+    alvos = {pid} | _descendentes(pid)
+    # PIDs registrados na criação só são encerrados se ainda estiverem no nosso grupo
+    for conhecido in pids_conhecidos:
+        try:
+            if os.getpgid(conhecido) == pid:
+                alvos.add(conhecido)
+        except OSError:
+            continue
+    try:
+        # O ChromeDriver é líder da própria sessão (start_new_session), então pgid == pid
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    for alvo in alvos:
+        try:
+            os.kill(alvo, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def remover_locks_orfaos(profile_path):
+    """Remove os arquivos Singleton* do perfil somente se o Chrome dono do lock já morreu.
+    Retorna False se o perfil está em uso por outro Chrome vivo nesta máquina."""
+    lock = os.path.join(profile_path, 'SingletonLock')
+    if os.name != 'nt' and os.path.islink(lock):
+        # No Linux/macOS o SingletonLock é um symlink para "<hostname>-<pid>"
+        host, _, pid = os.readlink(lock).rpartition('-')
+        if host == socket.gethostname() and pid.isdigit() and _pid_vivo(int(pid)):
+            return False
+    for arquivo in glob.glob(os.path.join(profile_path, 'Singleton*')):
+        try:
+            os.remove(arquivo)
+        except Exception:
+            pass
+    return True
+
+
+def criar_service():
+    """Cria o Service do ChromeDriver em um grupo de processos próprio."""
+    if os.name == 'nt':
+        popen_kw = {'creation_flags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        popen_kw = {'start_new_session': True}
+    return Service(ChromeDriverManager().install(), popen_kw=popen_kw)
+
+
+class DriverGerenciado:
+    """Driver do Chrome cujo ciclo de vida se limita aos processos que ele mesmo criou."""
+
+    def __init__(self, chrome_options, profile_path=None, timeout_travamento=DRIVER_TIMEOUT):
+        self.chrome_options = chrome_options
+        self.profile_path = profile_path
+        self.timeout_travamento = timeout_travamento
+        self.driver = None
+        self.pid = None
+        self.pids = set()
+        self._service = None
+        self._inicio_tarefa = None
+        self._derrubado = False
+        # Capturas seguidas sem resultado (usado para conferir a sessão de tempos em tempos)
+        self.falhas_seguidas = 0
+
+    def iniciar(self, tentativas=3):
+        """Cria o driver (com retry em caso de SessionNotCreatedException).
+        Retorna True se o navegador foi iniciado."""
+        for tentativa_driver in range(tentativas):
+            service = None
+            try:
+                service = criar_service()
+                self.driver = webdriver.Chrome(service=service, options=self.chrome_options)
+                self.driver.set_page_load_timeout(self.timeout_travamento)
+                self._service = service
+                self.pid = service.process.pid
+                self.pids = {self.pid} | _descendentes(self.pid)
+                self._derrubado = False
+                return True
+            except Exception as e:
+                erro = str(e).split('\n')[0][:100]
+                # Limpar apenas os processos desta tentativa
+                # (o Service só ganha o atributo process se o Popen funcionou)
+                processo = getattr(service, 'process', None)
+                if processo is not None and processo.poll() is None:
+                    encerrar_arvore(processo.pid)
+                if self.profile_path:
+                    time.sleep(1)
+                    remover_locks_orfaos(self.profile_path)
+                if tentativa_driver < tentativas - 1:
+                    print(f"  ⚠ Erro ao iniciar navegador: {erro}")
+                    print(f"  Tentando novamente ({tentativa_driver + 2}/{tentativas})...")
+                    time.sleep(3)
+                else:
+                    print(f"  ✗ Não foi possível iniciar o navegador: {erro}")
+        self.driver = None
+        return False
+
+    def encerrar(self):
+        """Fecha o navegador; se não responder, encerra a árvore de processos dele."""
+        if self.driver is not None and not self._derrubado:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        processo = getattr(self._service, 'process', None)
+        if processo is not None and processo.poll() is None:
+            encerrar_arvore(self.pid, self.pids)
+        self.driver = None
+        self._service = None
+        self._inicio_tarefa = None
+
+    def reiniciar(self):
+        """Recria somente este driver, mantendo opções e perfil."""
+        self.encerrar()
+        if self.profile_path:
+            remover_locks_orfaos(self.profile_path)
+        return self.iniciar()
+
+    def derrubar(self):
+        """Encerra à força os processos deste driver (usado pelo watchdog).
+        Chamadas bloqueadas no driver passam a falhar imediatamente."""
+        self._derrubado = True
+        if self.pid is not None:
+            encerrar_arvore(self.pid, self.pids)
+
+    def saudavel(self):
+        """Verifica se o ChromeDriver e a aba do Chrome ainda respondem."""
+        if self.driver is None or self._derrubado or self._service is None:
+            return False
+        processo = getattr(self._service, 'process', None)
+        if processo is None or processo.poll() is not None:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def travado(self):
+        """True se a tarefa atual excedeu o timeout de travamento."""
+        inicio = self._inicio_tarefa
+        return (
+            inicio is not None and not self._derrubado
+            and time.time() - inicio > self.timeout_travamento
+        )
+
+    @contextmanager
+    def tarefa(self):
+        """Marca o início/fim de uma captura para o watchdog."""
+        self._inicio_tarefa = time.time()
+        try:
+            yield self.driver
+        finally:
+            self._inicio_tarefa = None
+
+
+class Watchdog(threading.Thread):
+    """Monitora drivers gerenciados e derruba os que travarem durante uma captura."""
+
+    def __init__(self, gerenciados, intervalo=5):
+        super().__init__(daemon=True)
+        self.gerenciados = gerenciados
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            for gerenciado in list(self.gerenciados):
+                if gerenciado.travado():
+                    print(f"  ⚠ Navegador (pid {gerenciado.pid}) sem resposta há mais de "
+                          f"{gerenciado.timeout_travamento}s - encerrando")
+                    gerenciado.derrubar()
+
+    def parar(self):
+        self._parar.set()
@@ -0,0 +1,250 @@
+import os
+import re
+import hmac
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from instagram_network_capture import (
+    configurar_chrome,
+    autenticar,
+    capturar_usuario_com_recuperacao,
+)
+from gerenciador_driver import DriverGerenciado, Watchdog
+
+# Carrega as variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Configurações
+DAEMON_HOST = os.getenv('DAEMON_HOST', '127.0.0.1')
+DAEMON_PORT = int(os.getenv('DAEMON_PORT', '8765'))
+DAEMON_WORKERS = int(os.getenv('DAEMON_WORKERS', '1'))
+DAEMON_DELAY = int(os.getenv('DAEMON_DELAY', '0'))
+JSON_FOLDER = os.getenv('DAEMON_OUTPUT_FOLDER', 'teste_json')
+# Token opcional exigido no header "Authorization: Bearer <token>"
+DAEMON_TOKEN = os.getenv('DAEMON_TOKEN', '')
+
+# Caracteres aceitos pelo Instagram em um username (usado em URLs e nomes de arquivo)
+USERNAME_VALIDO = re.compile(r'[A-Za-z0-9._]{1,30}')
+
+
+class PoolDrivers:
+    """Mantém navegadores autenticados vivos entre jobs de captura."""
+
+    def __init__(self, usuario_login, senha_login, tamanho=1):
+        self.usuario_login = usuario_login
+        self.senha_login = senha_login
+        self.tamanho = tamanho
+        self.drivers = []
+        self._livres = queue.Queue()
+        self._watchdog = Watchdog(self.drivers)
+
+    def iniciar(self):
+        """Cria e autentica os drivers. Retorna quantos ficaram disponíveis."""
+        chrome_profile = os.getenv('CHROME_PROFILE_DIR', '')
+        for i in range(self.tamanho):
+            # Cada navegador precisa de um perfil próprio (o Chrome trava o user-data-dir)
+            perfil = f"{chrome_profile}_{i}" if chrome_profile and i > 0 else chrome_profile
+            chrome_options, profile_path = configurar_chrome(perfil)
+            gerenciado = DriverGerenciado(chrome_options, profile_path)
+            try:
+                if not gerenciado.iniciar():
+                    continue
+                if not autenticar(gerenciado, self.usuario_login, self.senha_login):
+                    print(f"✗ Worker {i}: falha no login")
+                    gerenciado.encerrar()
+                    continue
+            except BaseException:
+                # Ctrl+C durante o login: o navegador ainda não está no pool
+                gerenciado.encerrar()
+                raise
+            self.drivers.append(gerenciado)
+            self._livres.put(gerenciado)
+        if self.drivers:
+            self._watchdog.start()
+        return len(self.drivers)
+
+    def livres(self):
+        return self._livres.qsize()
+
+    def obter(self, timeout=None):
+        """Reserva um driver livre (bloqueia até um ficar disponível)."""
+        return self._livres.get(timeout=timeout)
+
+    def devolver(self, gerenciado):
+        self._livres.put(gerenciado)
+
+    def encerrar(self):
+        self._watchdog.parar()
+        for gerenciado in self.drivers:
+            gerenciado.encerrar()
+        self.drivers.clear()
+
+
+class CapturaHandler(BaseHTTPRequestHandler):
+    """API HTTP local do daemon.
+
+    GET  /status    -> estado do pool
+    POST /capturar  -> {"usernames": [...], "delay": 0}; responde em NDJSON,
+                       uma linha por perfil assim que a captura termina
+    POST /encerrar  -> encerra o daemon
+
+    Os POST exigem Content-Type: application/json, que obriga o navegador a
+    fazer preflight CORS, e todas as rotas exigem o token se DAEMON_TOKEN
+    estiver definido.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    pool = None
+    output_folder = JSON_FOLDER
+    token = DAEMON_TOKEN
+
+    def log_message(self, format, *args):
+        pass
+
+    def _responder_json(self, status, dados):
+        corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _rejeitar(self, status, erro):
+        # O corpo não foi lido: a conexão não pode ser reaproveitada
+        self.close_connection = True
+        self._responder_json(status, {'erro': erro})
+
+    def _autorizado(self):
+        if not self.token:
+            return True
+        recebido = self.headers.get('Authorization', '').encode('utf-8')
+        if hmac.compare_digest(recebido, f'Bearer {self.token}'.encode('utf-8')):
+            return True
+        self._rejeitar(401, 'token inválido')
+        return False
+
+    def _enviar_linha(self, dados):
+        """Envia uma linha NDJSON como chunk HTTP."""
+        linha = (json.dumps(dados, ensure_ascii=False) + '\n').encode('utf-8')
+        self.wfile.write(f"{len(linha):X}\r\n".encode('ascii') + linha + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if not self._autorizado():
+            return
+        if self.path == '/status':
+            self._responder_json(200, {
+                'drivers': len(self.pool.drivers),
+                'livres': self.pool.livres(),
+                'pids': [g.pid for g in self.pool.drivers],
+            })
+        else:
+            self._responder_json(404, {'erro': 'rota não encontrada'})
+
+    def do_POST(self):
+        if not self._autorizado():
+            return
+        tipo = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if tipo != 'application/json':
+            self._rejeitar(415, 'Content-Type deve ser application/json')
+            return
+        if self.path == '/encerrar':
+            self._responder_json(200, {'status': 'encerrando'})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if self.path != '/capturar':
+            self._responder_json(404, {'erro': 'rota não encontrada'})
+            return
+
+        try:
+            tamanho = int(self.headers.get('Content-Length', 0))
+            job = json.loads(self.rfile.read(tamanho) or b'{}')
+            usernames = job['usernames']
+            if not isinstance(usernames, list) or not all(isinstance(u, str) for u in usernames):
+                raise TypeError("'usernames' deve ser uma lista de strings")
+            invalidos = [u for u in usernames if not USERNAME_VALIDO.fullmatch(u)]
+            if invalidos:
+                raise ValueError(f"usernames inválidos: {invalidos[:10]}")
+            delay = int(job.get('delay', DAEMON_DELAY))
+        except (KeyError, TypeError, ValueError) as e:
+            self._responder_json(400, {'erro': f'job inválido: {e}'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        gerenciado = self.pool.obter()
+        try:
+            for username in usernames:
+                inicio = time.time()
+                try:
+                    # Se o navegador cair, só este driver é reiniciado e o perfil é repetido
+                    ok = capturar_usuario_com_recuperacao(
+                        gerenciado, username, self.pool.usuario_login, self.pool.senha_login,
+                        delay, self.output_folder
+                    )
+                    resultado = {
+                        'username': username,
+                        'sucesso': ok,
+                        'arquivo': os.path.join(self.output_folder, f"{username}_stories.json") if ok else None,
+                    }
+                except Exception as e:
+                    erro = str(e).split('\n')[0][:200] if str(e) else type(e).__name__
+                    resultado = {'username': username, 'sucesso': False, 'erro': erro}
+                resultado['duracao'] = round(time.time() - inicio, 2)
+                self._enviar_linha(resultado)
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente desconectou - o driver continua válido para o próximo job
+            pass
+        finally:
+            self.pool.devolver(gerenciado)
+            # Sempre encerra o stream chunked, mesmo após erro
+            try:
+                self.wfile.write(b"0\r\n\r\n")
+            except OSError:
+                pass
+
+
+def iniciar_daemon(usuario_login, senha_login, host=DAEMON_HOST, port=DAEMON_PORT,
+                   workers=DAEMON_WORKERS, output_folder=JSON_FOLDER):
+    """Sobe os navegadores autenticados e atende jobs de captura até ser encerrado.
+    Retorna False se a porta está ocupada ou nenhum navegador pôde ser iniciado."""
+    os.makedirs(output_folder, exist_ok=True)
+
+    # A porta é reservada antes de abrir os navegadores (e de um eventual 2FA)
+    try:
+        server = ThreadingHTTPServer((host, port), CapturaHandler)
+    except OSError as e:
+        print(f"✗ Não foi possível ouvir em {host}:{port}: {e}")
+        return False
+
+    print(f"Iniciando daemon... [{workers} navegador(es)]\n")
+    pool = PoolDrivers(usuario_login, senha_login, workers)
+    try:
+        if pool.iniciar() == 0:
+            print("✗ Nenhum navegador disponível - daemon não iniciado")
+            return False
+
+        CapturaHandler.pool = pool
+        CapturaHandler.output_folder = output_folder
+        print(f"✓ Daemon ouvindo em http://{host}:{port} ({len(pool.drivers)} navegador(es))")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n\n⚠ Daemon interrompido pelo usuário")
+    finally:
+        server.server_close()
+        pool.encerrar()
+        print("✓ Navegadores encerrados")
+    return True
+
+
+if __name__ == '__main__':
+    iniciar_daemon(
+        usuario_login=str(os.getenv("LOGIN")),
+        senha_login=str(os.getenv("SENHA")),
+    )
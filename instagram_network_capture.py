@@ -1,18 +1,16 @@
-from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from gerenciador_driver import DriverGerenciado, Watchdog, remover_locks_orfaos
 import json
 import time
 import re
 import os
-import subprocess
-import glob
 
 COOKIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cookies_instagram.json')
+# Capturas seguidas sem stories (e sem redirecionar para o login) antes de conferir a sessão
+MAX_FALHAS_SEGUIDAS = int(os.getenv('MAX_FALHAS_SEGUIDAS', '5'))
 
 
 def salvar_cookies(driver):
@@ -90,6 +88,20 @@ def verificar_sessao_ativa(driver):
         return False
 
 
+def _sessao_expirada(driver):
+    """Confirma que a sessão caiu: a home redireciona para o login ou mostra o formulário.
+    A simples ausência dos indicadores de sessão não basta, para não refazer login à toa."""
+    try:
+        driver.get("https://www.instagram.com/")
+        time.sleep(4)
+        url = driver.current_url
+        if "login" in url or "accounts" in url:
+            return True
+        return bool(driver.find_elements(By.NAME, "username") or driver.find_elements(By.NAME, "email"))
+    except Exception:
+        return False
+
+
 def _esta_logado(driver):
     """Verifica se a página atual é a interface logada do Instagram."""
     try:
@@ -321,13 +333,7 @@ def fazer_login_instagram(driver, usuario, senha):
             return resultado
         
         # Fechar popups
-        for _ in range(2):
-            try:
-                not_now_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Agora não') or contains(text(), 'Not Now')]")
-                not_now_button.click()
-                time.sleep(1)
-            except:
-                pass
+        _fechar_popups(driver)
         
         logado = "login" not in driver.current_url
         if logado:
@@ -409,10 +415,9 @@ def capturar_stories_usuario(driver, username, delay=3, output_folder="."):
         return False
 
 
-def capturar_multiplas_paginas(lista_usuarios, usuario_login, senha_login, delay=3, max_tentativas_login=3, output_folder="."):
-    """Captura stories de múltiplos usuários"""
-    
-    # Configurar Chrome
+def configurar_chrome(chrome_profile=None):
+    """Monta as opções do Chrome.
+    Retorna (chrome_options, profile_path); profile_path é None sem perfil persistente."""
     chrome_options = Options()
     # chrome_options.add_argument('--headless=new')
     chrome_options.add_argument('--window-size=1920,1080')
@@ -423,180 +428,189 @@ def capturar_multiplas_paginas(lista_usuarios, usuario_login, senha_login, delay
     chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
     
     # Perfil persistente do Chrome (mantém sessão entre execuções)
-    chrome_profile = os.getenv('CHROME_PROFILE_DIR', '')
-    if chrome_profile:
-        profile_path = os.path.abspath(chrome_profile)
-        os.makedirs(profile_path, exist_ok=True)
-        # Verificar integridade do perfil (Preferences corrompido impede o Chrome de abrir)
-        prefs_file = os.path.join(profile_path, 'Default', 'Preferences')
-        if os.path.exists(prefs_file):
-            try:
-                with open(prefs_file, 'r', encoding='utf-8') as f:
-                    json.load(f)
-            except (json.JSONDecodeError, ValueError):
-                print("  ⚠ Perfil corrompido detectado - recriando...")
-                import shutil
-                shutil.rmtree(profile_path, ignore_errors=True)
-                os.makedirs(profile_path, exist_ok=True)
-        # Remover lock files de execução anterior
-        for lock in glob.glob(os.path.join(profile_path, 'Singleton*')):
-            try:
-                os.remove(lock)
-            except Exception:
-                pass
-        chrome_options.add_argument(f'--user-data-dir={profile_path}')
-        print(f"Perfil Chrome: {profile_path}")
+    if chrome_profile is None:
+        chrome_profile = os.getenv('CHROME_PROFILE_DIR', '')
+    if not chrome_profile:
+        return chrome_options, None
     
-    driver = None
+    profile_path = os.path.abspath(chrome_profile)
+    os.makedirs(profile_path, exist_ok=True)
+    # Verificar integridade do perfil (Preferences corrompido impede o Chrome de abrir)
+    prefs_file = os.path.join(profile_path, 'Default', 'Preferences')
+    if os.path.exists(prefs_file):
+        try:
+            with open(prefs_file, 'r', encoding='utf-8') as f:
+                json.load(f)
+        except (json.JSONDecodeError, ValueError):
+            print("  ⚠ Perfil corrompido detectado - recriando...")
+            import shutil
+            shutil.rmtree(profile_path, ignore_errors=True)
+            os.makedirs(profile_path, exist_ok=True)
+    # Remover lock files de execução anterior (apenas se o Chrome dono já morreu)
+    if not remover_locks_orfaos(profile_path):
+        print("  ⚠ Perfil em uso por outro Chrome - use um CHROME_PROFILE_DIR por processo")
+    chrome_options.add_argument(f'--user-data-dir={profile_path}')
+    print(f"Perfil Chrome: {profile_path}")
+    return chrome_options, profile_path
+
+
+def _fechar_popups(driver):
+    """Fecha os popups de 'Agora não' exibidos após o login."""
+    for _ in range(2):
+        try:
+            not_now_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Agora não') or contains(text(), 'Not Now')]")
+            not_now_button.click()
+            time.sleep(1)
+        except:
+            pass
+
+
+def autenticar(gerenciado, usuario_login, senha_login, max_tentativas_login=3):
+    """Garante uma sessão autenticada no driver gerenciado (sessão ativa, cookies ou login).
+    Pode reiniciar o driver entre tentativas; retorna True se logado."""
+    driver = gerenciado.driver
     
-    try:
-        print(f"Iniciando... [{len(lista_usuarios)} páginas]\n")
+    print("Verificando sessão...")
+    if verificar_sessao_ativa(driver):
+        print("✓ Sessão ativa encontrada - login não necessário\n")
+        return True
+    
+    # Tentar restaurar cookies se não tem perfil persistente
+    if not gerenciado.profile_path and carregar_cookies(driver):
+        driver.refresh()
+        time.sleep(3)
+        if verificar_sessao_ativa(driver):
+            print("✓ Sessão restaurada via cookies\n")
+            return True
+    
+    # Se nenhuma sessão ativa, fazer login com retry
+    tentativa_login = 0
+    
+    while tentativa_login < max_tentativas_login:
+        tentativa_login += 1
         
-        # Encerrar processos órfãos que podem travar o perfil
-        if chrome_profile:
-            try:
-                subprocess.run(
-                    ['taskkill', '/F', '/IM', 'chrome.exe', '/T'],
-                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-                )
-                subprocess.run(
-                    ['taskkill', '/F', '/IM', 'chromedriver.exe', '/T'],
-                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-                )
-                time.sleep(3)
-                # Limpar lock files restantes
-                for lock in glob.glob(os.path.join(profile_path, 'Singleton*')):
-                    try:
-                        os.remove(lock)
-                    except Exception:
-                        pass
-            except Exception:
-                pass
+        if tentativa_login > 1:
+            time.sleep(5)
+            if not gerenciado.reiniciar():
+                return False
+            driver = gerenciado.driver
         
-        # Criar driver (com retry em caso de SessionNotCreatedException)
-        driver_criado = False
-        for tentativa_driver in range(3):
-            try:
-                service = Service(ChromeDriverManager().install())
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-                driver_criado = True
+        print(f"Login... (tentativa {tentativa_login}/{max_tentativas_login})")
+        
+        resultado = fazer_login_instagram(driver, usuario_login, senha_login)
+        
+        if resultado == "sucesso":
+            print("✓ Login realizado\n")
+            return True
+        elif resultado == "timeout_2fa":
+            # 2FA apareceu mas o tempo acabou - NÃO fechar navegador,
+            # dar mais tempo no mesmo browser
+            print("  → Dando mais tempo para resolver 2FA...")
+            login_timeout = int(os.getenv('LOGIN_TIMEOUT', '300'))
+            resultado2 = aguardar_login_ou_2fa(driver, timeout=login_timeout)
+            if resultado2 == "sucesso":
+                # Fechar popups após 2FA resolvido
+                _fechar_popups(driver)
+                salvar_cookies(driver)
+                print("✓ Login realizado (após 2FA)\n")
+                return True
+            print("  ✗ Não foi possível completar o 2FA")
+            break  # Não adianta retentar, precisa de intervenção
+        else:
+            if tentativa_login < max_tentativas_login:
+                print(f"  Aguardando 10s para nova tentativa...\n")
+                time.sleep(10)
+    
+    return False
+
+
+def capturar_usuario_com_recuperacao(gerenciado, username, usuario_login, senha_login, delay=3, output_folder=".", max_reinicios=2):
+    """Captura um usuário; se o navegador travar ou cair, reinicia apenas este driver
+    e tenta o mesmo usuário de novo. Se a sessão do Instagram expirou, refaz o login."""
+    for reinicio in range(max_reinicios + 1):
+        with gerenciado.tarefa():
+            ok = capturar_stories_usuario(gerenciado.driver, username, delay, output_folder)
+        if ok:
+            gerenciado.falhas_seguidas = 0
+            return True
+        if gerenciado.saudavel():
+            # Navegador ok: quase sempre o perfil só não tem stories. A sessão só é
+            # conferida se a captura caiu no login ou após várias falhas seguidas
+            url = gerenciado.driver.current_url
+            if "login" in url or "accounts" in url:
+                expirada = True
+            else:
+                gerenciado.falhas_seguidas += 1
+                if gerenciado.falhas_seguidas < MAX_FALHAS_SEGUIDAS:
+                    return False
+                gerenciado.falhas_seguidas = 0
+                expirada = _sessao_expirada(gerenciado.driver)
+            if not expirada:
+                return False
+            if reinicio == max_reinicios:
                 break
-            except Exception as e:
-                erro = str(e).split('\n')[0][:100]
-                if tentativa_driver < 2:
-                    print(f"  ⚠ Erro ao iniciar navegador: {erro}")
-                    print(f"  Tentando novamente ({tentativa_driver + 2}/3)...")
-                    # Matar tudo e limpar antes de tentar novamente
-                    for proc in ['chrome.exe', 'chromedriver.exe']:
-                        subprocess.run(
-                            ['taskkill', '/F', '/IM', proc, '/T'],
-                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-                        )
-                    time.sleep(3)
-                    for lock in glob.glob(os.path.join(profile_path, 'Singleton*')) if chrome_profile else []:
-                        try:
-                            os.remove(lock)
-                        except Exception:
-                            pass
-                else:
-                    print(f"  ✗ Não foi possível iniciar o navegador: {erro}")
-                    return
+            print(f"  ⚠ Sessão expirada em {username} - fazendo login novamente...")
+            if not autenticar(gerenciado, usuario_login, senha_login):
+                break
+            continue
+        if reinicio == max_reinicios:
+            break
+        print(f"  ⚠ Navegador caiu em {username} - reiniciando ({reinicio + 1}/{max_reinicios})...")
+        if not (gerenciado.reiniciar() and autenticar(gerenciado, usuario_login, senha_login)):
+            break
+    return False
+
+
+def capturar_multiplas_paginas(lista_usuarios, usuario_login, senha_login, delay=3, max_tentativas_login=3, output_folder="."):
+    """Captura stories de múltiplos usuários.
+    Retorna False se o navegador ou o login falharam ou a captura foi interrompida."""
+    
+    # Configurar Chrome
+    chrome_options, chrome_profile = configurar_chrome()
+    
+    gerenciado = DriverGerenciado(chrome_options, chrome_profile)
+    watchdog = Watchdog([gerenciado])
+    
+    try:
+        print(f"Iniciando... [{len(lista_usuarios)} páginas]\n")
         
-        if not driver_criado:
-            return
+        if not gerenciado.iniciar():
+            return False
         
         # Verificar se já existe sessão ativa (perfil persistente ou cookies)
-        login_sucesso = False
-        
-        print("Verificando sessão...")
-        if verificar_sessao_ativa(driver):
-            print("✓ Sessão ativa encontrada - login não necessário\n")
-            login_sucesso = True
-        else:
-            # Tentar restaurar cookies se não tem perfil persistente
-            if not chrome_profile and carregar_cookies(driver):
-                driver.refresh()
-                time.sleep(3)
-                if verificar_sessao_ativa(driver):
-                    print("✓ Sessão restaurada via cookies\n")
-                    login_sucesso = True
-        
-        # Se nenhuma sessão ativa, fazer login com retry
-        if not login_sucesso:
-            tentativa_login = 0
-            
-            while tentativa_login < max_tentativas_login and not login_sucesso:
-                tentativa_login += 1
-                
-                if tentativa_login > 1:
-                    driver.quit()
-                    time.sleep(5)
-                    service = Service(ChromeDriverManager().install())
-                    driver = webdriver.Chrome(service=service, options=chrome_options)
-                
-                print(f"Login... (tentativa {tentativa_login}/{max_tentativas_login})")
-                
-                resultado = fazer_login_instagram(driver, usuario_login, senha_login)
-                
-                if resultado == "sucesso":
-                    print("✓ Login realizado\n")
-                    login_sucesso = True
-                elif resultado == "timeout_2fa":
-                    # 2FA apareceu mas o tempo acabou - NÃO fechar navegador,
-                    # dar mais tempo no mesmo browser
-                    print("  → Dando mais tempo para resolver 2FA...")
-                    login_timeout = int(os.getenv('LOGIN_TIMEOUT', '300'))
-                    resultado2 = aguardar_login_ou_2fa(driver, timeout=login_timeout)
-                    if resultado2 == "sucesso":
-                        # Fechar popups após 2FA resolvido
-                        for _ in range(2):
-                            try:
-                                not_now_button = driver.find_element(By.XPATH, "//button[contains(text(), 'Agora não') or contains(text(), 'Not Now')]")
-                                not_now_button.click()
-                                time.sleep(1)
-                            except:
-                                pass
-                        salvar_cookies(driver)
-                        print("✓ Login realizado (após 2FA)\n")
-                        login_sucesso = True
-                    else:
-                        print("  ✗ Não foi possível completar o 2FA")
-                        break  # Não adianta retentar, precisa de intervenção
-                else:
-                    if tentativa_login < max_tentativas_login:
-                        print(f"  Aguardando 10s para nova tentativa...\n")
-                        time.sleep(10)
-
-        
-        if not login_sucesso:
+        if not autenticar(gerenciado, usuario_login, senha_login, max_tentativas_login):
             print("✗ Falha após todas as tentativas de login")
-            return
+            return False
         
         # Processar cada usuário
         print("Capturando:")
         sucesso = 0
+        watchdog.start()
         
         for username in lista_usuarios:
-            if capturar_stories_usuario(driver, username, delay, output_folder):
+            if capturar_usuario_com_recuperacao(gerenciado, username, usuario_login, senha_login, delay, output_folder):
                 sucesso += 1
+            elif not gerenciado.saudavel():
+                print("✗ Navegador indisponível após reinícios - interrompendo")
+                return False
         
         # Resumo
         print(f"\nConcluído: {sucesso}/{len(lista_usuarios)}")
+        return True
         
     except KeyboardInterrupt:
         print("\n\n⚠ Execução interrompida pelo usuário")
+        return False
         
     except Exception as e:
         erro_tipo = type(e).__name__
         erro_msg = str(e).split('\n')[0][:100] if str(e) else "Erro desconhecido"
         print(f"\n✗ Erro inesperado ({erro_tipo}): {erro_msg}")
+        return False
         
     finally:
-        if driver:
-            try:
-                driver.quit()
-            except Exception:
-                pass
+        watchdog.parar()
+        gerenciado.encerrar()
 
 
 if __name__ == "__main__":
@@ -1,21 +1,18 @@
 import os
 from dotenv import load_dotenv
 import json
-from instagram_network_capture import capturar_multiplas_paginas
-import duckdb as db
-import pandas as pd
+import csv
+import argparse
+import sys
 from datetime import datetime
-from google.cloud import storage
 import shutil
 
+# Dependências pesadas (selenium, duckdb, pandas, google.cloud) são importadas
+# apenas dentro dos subcomandos que precisam delas, para o CLI iniciar rápido.
+
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
-# Conexões do DuckDB com extensão JSON
-con = db.connect()
-con.install_extension('json')
-con.load_extension('json')
-
 # Define a data atual
 hoje = datetime.now().strftime('%Y%m%d')
 
@@ -25,15 +22,39 @@ EXCEL_FILE = 'Perfis testes - Novembro.xlsx'
 JSON_FOLDER = 'teste_json'
 OUTPUT_FOLDER = 'instagram'
 MANTER_ARQUIVOS_BRUTOS = os.getenv('MANTER_ARQUIVOS_BRUTOS', 'false').lower() == 'true'
+# Dataset do Apify a processar junto com as capturas do Selenium (opcional)
+APIFY_DATASET_ID = os.getenv('APIFY_DATASET_ID', '')
+# Arquivos brutos inválidos são movidos para cá, com relatório em CSV
+QUARENTENA_FOLDER = os.getenv('QUARENTENA_FOLDER', 'quarentena')
+# Limites do DuckDB para diretórios grandes (ex.: DUCKDB_MEMORY_LIMIT=2GB)
+DUCKDB_MEMORY_LIMIT = os.getenv('DUCKDB_MEMORY_LIMIT', '')
+DUCKDB_THREADS = os.getenv('DUCKDB_THREADS', '')
+DUCKDB_TEMP_DIR = os.getenv('DUCKDB_TEMP_DIR', '')
 
 def tratar_link_insta(link):
     """Extrai o username do link do Instagram"""
     user = str(link).split('/')[3]
     return user
 
+def conectar_duckdb():
+    """Conexão do DuckDB com extensão JSON (instala só se ainda não estiver disponível)"""
+    import duckdb as db
+    from analise_stories import configurar_duckdb
+
+    con = db.connect()
+    disponivel = con.execute(
+        "select installed or loaded from duckdb_extensions() where extension_name = 'json'"
+    ).fetchone()
+    if not (disponivel and disponivel[0]):
+        con.install_extension('json')
+    con.load_extension('json')
+    configurar_duckdb(con, DUCKDB_MEMORY_LIMIT, DUCKDB_THREADS, DUCKDB_TEMP_DIR)
+    return con
+
 def upload_to_gcs(bucket_name, source_file, destination_blob):
     """Upload de arquivo para o GCS"""
     try:
+        from google.cloud import storage
         storage_client = storage.Client()
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(destination_blob)
@@ -44,16 +65,32 @@ def upload_to_gcs(bucket_name, source_file, destination_blob):
         print(f"✗ Erro ao enviar para GCS: {e}")
         return False
 
-def main():
-    print("=" * 60)
-    print("INSTAGRAM STORIES CAPTURE")
-    print("=" * 60)
-    print()
-    
-    # 1. Criar pasta teste_json se não existir
-    os.makedirs(JSON_FOLDER, exist_ok=True)
-    
-    # 2. Ler Excel e extrair usernames
+def enviar_para_quarentena(erros):
+    """Move os arquivos inválidos para a quarentena e registra no relatório"""
+    if not erros:
+        return
+    os.makedirs(QUARENTENA_FOLDER, exist_ok=True)
+    relatorio = os.path.join(QUARENTENA_FOLDER, f'relatorio_{hoje}.csv')
+    novo = not os.path.exists(relatorio)
+    with open(relatorio, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if novo:
+            writer.writerow(['arquivo', 'fonte', 'linha', 'erro'])
+        for erro in erros:
+            # Em NDJSON só a linha indicada é inválida; o arquivo vai inteiro para conferência
+            if os.path.exists(erro['arquivo']):
+                shutil.move(erro['arquivo'], os.path.join(QUARENTENA_FOLDER, os.path.basename(erro['arquivo'])))
+            writer.writerow([erro['arquivo'], erro['fonte'], erro.get('linha') or '', erro['erro']])
+    print(f"⚠️  {len(erros)} arquivo(s) em quarentena: {relatorio}")
+
+def arquivos_saida(data=hoje):
+    """Arquivos gerados pelo processamento de uma data"""
+    return [f'output_final_{data}.csv', f'stickers_{data}.parquet']
+
+def ler_usernames():
+    """Lê o Excel e extrai os usernames"""
+    import pandas as pd
+
     print("📊 Processando Excel...")
     df1 = pd.read_excel(EXCEL_FILE, sheet_name='Hyeser')
     df2 = pd.read_excel(EXCEL_FILE, sheet_name='Fabio')
@@ -62,101 +99,114 @@ def main():
     df = pd.concat([df1, df2], ignore_index=True)
     df['LINK'] = df['LINK'].apply(lambda x: tratar_link_insta(x))
     lista_usernames = list(df['LINK'])
-    
+
     print(f"✓ {len(lista_usernames)} perfis encontrados")
     print()
-    
-    # 3. Capturar stories
+    return lista_usernames
+
+def capturar(lista_usernames, delay=5):
+    """Captura os stories dos usernames para JSON_FOLDER. Retorna False em caso de falha"""
+    from instagram_network_capture import capturar_multiplas_paginas
+
+    os.makedirs(JSON_FOLDER, exist_ok=True)
     print(f"📸 Capturando stories...")
     print("-" * 60)
-    capturar_multiplas_paginas(
+    ok = capturar_multiplas_paginas(
         lista_usuarios=lista_usernames,
         usuario_login=str(os.getenv("LOGIN")),
         senha_login=str(os.getenv("SENHA")),
-        delay=5,
+        delay=delay,
         output_folder=JSON_FOLDER
     )
     print()
-    
-    # 4. Processar JSONs
+    return ok
+
+def processar():
+    """Extrai o reels_media dos JSONs e gera o CSV e o Parquet de stickers"""
+    from analise_stories import carregar_fontes, links_por_origem
+    from fontes_stories import FonteSelenium, FonteApify
+
+    os.makedirs(JSON_FOLDER, exist_ok=True)
+
+    # Processar JSONs
     print("⚙️  Processando JSONs...")
+    quarentena = []
     for item in os.listdir(JSON_FOLDER):
         if item.endswith('.json'):
             filepath = os.path.join(JSON_FOLDER, item)
-            with open(filepath, 'r', encoding='utf-8') as f:
-                teste = json.load(f)
-                try:
-                    novo = teste['require'][0][3][0]['__bbox']['require'][0][3][1]['__bbox']['result']['data']['xdt_api__v1__feed__reels_media']['reels_media']
-                    with open(filepath, 'w', encoding='utf-8') as fw:
-                        json.dump(novo, fw, ensure_ascii=False, indent=4)
-                except (KeyError, IndexError) as e:
-                    print(f"⚠️  Erro ao processar {item}: {e}")
-    
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    teste = json.load(f)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                quarentena.append({'arquivo': filepath, 'fonte': 'selenium', 'erro': f'JSON inválido: {e}'})
+                continue
+            if isinstance(teste, list):
+                # Já extraído em um processamento anterior
+                continue
+            try:
+                novo = teste['require'][0][3][0]['__bbox']['require'][0][3][1]['__bbox']['result']['data']['xdt_api__v1__feed__reels_media']['reels_media']
+                with open(filepath, 'w', encoding='utf-8') as fw:
+                    json.dump(novo, fw, ensure_ascii=False, indent=4)
+            except (KeyError, IndexError, TypeError) as e:
+                quarentena.append({'arquivo': filepath, 'fonte': 'selenium', 'erro': f'reels_media não encontrado: {e!r}'})
+
+    enviar_para_quarentena(quarentena)
     print(f"✓ JSONs processados")
     print()
-    
-    # 5. Gerar CSV com DuckDB
+
+    # Gerar CSV com DuckDB
     print("📊 Gerando CSV...")
-    path = os.path.join(JSON_FOLDER, '*.json')
-    df = con.execute('''
-    with pt1 as (
-    SELECT
-    user.username AS username,
-    unnest(items) AS item
-    FROM read_json_auto(?, ignore_errors=true)
-    ),
-    pt2 as (
-    SELECT
-    username,
-    replace(split(split(unnest(item.story_link_stickers).story_link.url, 'u=')[2], '%2F')[3], 'www.', '') AS story_link_url
-    FROM pt1
-    ),
-    p3 as (
-    select
-    username,
-    case
-    when story_link_url = 'amzlink.to' then 'Amazon'
-    when story_link_url = 'mercadolivre.com' then 'Mercado Livre'
-    when story_link_url = 'mercadolivre.com.br' then 'Mercado Livre'
-    when story_link_url = 'produto.mercadolivre.com.br' then 'Mercado Livre'
-    when story_link_url = 's.shopee.com.br' then 'Shopee'
-    when story_link_url = 'minhaloja.natura.com' then 'Natura'
-    when story_link_url = 'magazinevoce.com.br' then 'Magazine Luiza'
-    when story_link_url = 'elausa.com.br' then 'Ela Usa'
-    when story_link_url = 'epocacosmeticos.com.br' then 'Época Cosméticos'
-    when story_link_url = 'natura.com.br' then 'Natura'
-    when story_link_url = 'sminhaloja.natura.com' then 'Natura'
-    when story_link_url = 'api.whatsapp.com' then 'WhatsApp'
-    when story_link_url = 'google.com' then 'Google'
-    when story_link_url = 'encurtador.com.br' then 'Encurtador'
-    when story_link_url = 'tinyurl.com' then 'Encurtador'
-    when story_link_url = 'br.shp.ee' then 'Shopee'
-    when story_link_url = 'instagram.com' then 'Instagram'
-    else null end as origin,
-    current_date as date
-    from pt2
-    )
-    select distinct username, origin, date from p3
-    where origin is not null
-    ''', [path]).df()
-    
-    csv_filename = f'output_final_{hoje}.csv'
-    df.to_csv(csv_filename, index=False)
-    
+    con = conectar_duckdb()
+    fontes = [FonteSelenium(JSON_FOLDER)]
+    if APIFY_DATASET_ID:
+        fontes.append(FonteApify(APIFY_DATASET_ID, os.path.join(JSON_FOLDER, 'apify')))
+    quarentena = []
+    total_itens = carregar_fontes(con, fontes, quarentena)
+    enviar_para_quarentena(quarentena)
+    print(f"✓ {total_itens} stories extraídos")
+
+    csv_filename, stickers_filename = arquivos_saida()
+
+    # Materializa os links uma vez (CSV e contagem leem a tabela, sem refazer a
+    # view story_stickers) e escreve direto do DuckDB, sem DataFrame
+    links_por_origem(con).create('links')
+    links = con.table('links')
+    links.write_csv(csv_filename)
+
     print(f"✓ CSV gerado: {csv_filename}")
-    print(f"✓ Total de usernames únicos: {df['username'].nunique()}")
+    print(f"✓ Total de usernames únicos: {links.aggregate('count(distinct username)').fetchone()[0]}")
+
+    # Stickers de todos os tipos (links, menções, hashtags, produtos) por item
+    con.table('story_stickers').write_parquet(stickers_filename)
+    print(f"✓ Stickers gerados: {stickers_filename}")
     print()
-    
-    # 6. Upload para GCS
+    con.close()
+
+def enviar(data=hoje):
+    """Envia os arquivos gerados para o GCS e remove as cópias locais.
+    Retorna o caminho do CSV no bucket, ou None em caso de falha"""
     print("☁️  Enviando para GCS...")
+    csv_filename, stickers_filename = arquivos_saida(data)
     gcs_path = f"{OUTPUT_FOLDER}/{csv_filename}"
-    if upload_to_gcs(BUCKET_NAME, csv_filename, gcs_path):
-        # Remover CSV local após upload
-        os.remove(csv_filename)
-        print(f"✓ CSV local removido")
+    if not os.path.exists(csv_filename):
+        print(f"✗ Arquivo não encontrado: {csv_filename}")
+        return None
+    locais = [csv_filename]
+    if os.path.exists(stickers_filename):
+        locais.append(stickers_filename)
+    for arquivo in locais:
+        if not upload_to_gcs(BUCKET_NAME, arquivo, f"{OUTPUT_FOLDER}/{arquivo}"):
+            # Nada é removido: o comando upload pode ser repetido com os mesmos arquivos
+            return None
+    # Remover arquivos locais só depois de todos os uploads
+    for arquivo in locais:
+        os.remove(arquivo)
+    print(f"✓ Arquivos locais removidos")
     print()
-    
-    # 7. Limpar pasta teste_json (opcional via variável de ambiente)
+    return gcs_path
+
+def limpar_brutos():
+    """Limpa a pasta teste_json (opcional via variável de ambiente)"""
     if MANTER_ARQUIVOS_BRUTOS:
         print(f"📁 Arquivos brutos mantidos em: {JSON_FOLDER}/")
     else:
@@ -165,16 +215,76 @@ def main():
             shutil.rmtree(JSON_FOLDER)
             print(f"✓ Pasta {JSON_FOLDER} limpa")
     print()
-    
+
+def main():
+    """Executa todas as etapas. Retorna o código de saída do processo"""
+    print("=" * 60)
+    print("INSTAGRAM STORIES CAPTURE")
+    print("=" * 60)
+    print()
+
+    # 1-3. Ler Excel e capturar stories
+    if not capturar(ler_usernames()):
+        print("✗ Falha na captura dos stories")
+        return 1
+
+    # 4-5. Processar JSONs e gerar CSV
+    processar()
+
+    # 6. Upload para GCS
+    gcs_path = enviar()
+    if gcs_path is None:
+        # Arquivos brutos são mantidos para reprocessar/reenviar
+        print("✗ Falha no envio para o GCS")
+        return 1
+
+    # 7. Limpar pasta teste_json
+    limpar_brutos()
+
     print("=" * 60)
     print("✅ PROCESSAMENTO CONCLUÍDO COM SUCESSO")
     print(f"📊 Arquivo: gs://{BUCKET_NAME}/{gcs_path}")
     print("=" * 60)
+    return 0
+
+def cli(argv=None):
+    """Interface de linha de comando. Retorna o código de saída do processo"""
+    parser = argparse.ArgumentParser(description="Captura e processamento de stories do Instagram")
+    sub = parser.add_subparsers(dest='comando')
+
+    p_capture = sub.add_parser('capture', help="captura os stories para a pasta teste_json")
+    p_capture.add_argument('usuarios', nargs='*', help="usernames (padrão: perfis do Excel)")
+    p_capture.add_argument('--delay', type=int, default=5, help="espera entre perfis, em segundos")
+
+    sub.add_parser('process', help="processa os JSONs capturados e gera CSV/Parquet")
+
+    p_upload = sub.add_parser('upload', help="envia os arquivos gerados para o GCS")
+    p_upload.add_argument('--data', default=hoje, help="data dos arquivos (AAAAMMDD)")
+
+    sub.add_parser('all', help="captura, processa, envia e limpa (padrão)")
+    sub.add_parser('daemon', help="mantém navegadores logados e recebe capturas via HTTP")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == 'capture':
+        return 0 if capturar(args.usuarios or ler_usernames(), args.delay) else 1
+    elif args.comando == 'process':
+        processar()
+        return 0
+    elif args.comando == 'upload':
+        return 0 if enviar(args.data) else 1
+    elif args.comando == 'daemon':
+        from instagram_daemon import iniciar_daemon
+        ok = iniciar_daemon(usuario_login=str(os.getenv("LOGIN")), senha_login=str(os.getenv("SENHA")))
+        return 0 if ok else 1
+    else:
+        return main()
 
 if __name__ == '__main__':
     try:
-        main()
+        sys.exit(cli())
     except Exception as e:
         print(f"\n✗ ERRO: {e}")
         import traceback
         traceback.print_exc()
+        sys.exit(1)
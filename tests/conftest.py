@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TAKEN_AT = 1760000000
+
+ITEM_SELENIUM = {
+    'pk': '111',
+    'taken_at': TAKEN_AT,
+    'media_type': 1,
+    'campo_desconhecido': {'x': 1},
+    'story_link_stickers': [
+        {'story_link': {'url': 'https://l.instagram.com/?u=https%3A%2F%2Fwww.amzlink.to%2Fabc&e=1'}}
+    ],
+    'story_bloks_stickers': [
+        {'bloks_sticker': {'sticker_data': {'ig_mention': {'username': 'marca'}}}}
+    ],
+    'reel_mentions': [{'user': {'username': 'marca'}}],
+    'story_hashtags': [{'hashtag': {'name': 'promo'}}],
+    'story_product_items': [{'product_item': {'name': 'Batom', 'merchant': {'username': 'loja'}}}],
+}
+
+
+def gravar(caminho, dados):
+    caminho.write_text(json.dumps(dados), encoding='utf-8')
+    return str(caminho)
+
+
+@pytest.fixture
+def con():
+    duckdb = pytest.importorskip('duckdb')
+    con = duckdb.connect()
+    yield con
+    con.close()
+
+
+@pytest.fixture
+def pasta_selenium(tmp_path):
+    pasta = tmp_path / 'selenium'
+    pasta.mkdir()
+    gravar(pasta / 'ana_stories.json', [{'user': {'username': 'ana'}, 'items': [ITEM_SELENIUM]}])
+    gravar(pasta / 'bia_stories.json', [{'user': {'username': 'bia'}, 'items': [{'pk': 2, 'taken_at': TAKEN_AT}]}])
+    return pasta
+
+
+@pytest.fixture
+def fonte_apify(tmp_path):
+    """Cria uma FonteApify com itens em memória no lugar do dataset remoto."""
+    from fontes_stories import FonteApify
+
+    class FonteApifyLocal(FonteApify):
+        def __init__(self, itens, tamanho_lote):
+            super().__init__('teste', str(tmp_path / 'apify'), tamanho_lote=tamanho_lote)
+            self.itens_dataset = itens
+
+        def itens(self):
+            return iter(self.itens_dataset)
+
+    def criar(itens, tamanho_lote=500):
+        return FonteApifyLocal(itens, tamanho_lote)
+    return criar
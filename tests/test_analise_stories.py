@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip('duckdb')
+
+from analise_stories import (
+    SCHEMA_STORY_ITEMS,
+    carregar_fontes,
+    links_por_origem,
+    stickers_por_perfil_dia,
+)
+from fontes_stories import FonteSelenium, FonteStories
+
+
+def test_schema_story_items_estavel(con, pasta_selenium):
+    carregar_fontes(con, [FonteSelenium(str(pasta_selenium))])
+    colunas = con.execute('describe story_items').fetchall()
+    assert [(nome, tipo) for nome, tipo, *_ in colunas] == [
+        (nome, 'TIMESTAMP WITH TIME ZONE' if tipo == 'TIMESTAMPTZ' else tipo)
+        for nome, tipo in SCHEMA_STORY_ITEMS.items()
+    ]
+
+
+def test_selenium_extrai_todos_os_stickers(con, pasta_selenium):
+    assert carregar_fontes(con, [FonteSelenium(str(pasta_selenium), tamanho_lote=1)]) == 2
+    linha = con.execute('''
+        select item_id, media_type, link_dominios, mencoes, hashtags, produtos
+        from story_items where username = 'ana'
+    ''').fetchone()
+    assert linha == ('111', 1, ['amzlink.to'], ['marca'], ['promo'], ['loja'])
+    # pk numérico é lido como texto e campos ausentes viram listas vazias
+    assert con.execute("select item_id, mencoes from story_items where username = 'bia'").fetchone() == ('2', [])
+
+
+def test_apify_e_selenium_compartilham_a_consulta(con, pasta_selenium, fonte_apify):
+    apify = fonte_apify([
+        {'requested': 'carla', 'stories': [{
+            'pk': 9, 'taken_at': 1760000000,
+            'story_link_stickers': [{'story_link': {'display_url': 'www.s.shopee.com.br/abc'}}],
+        }]},
+        {'requested': 'dani', 'stories': 'No story available'},
+    ])
+    carregar_fontes(con, [FonteSelenium(str(pasta_selenium)), apify])
+
+    links = sorted((username, origem) for username, origem, _ in links_por_origem(con).fetchall())
+    assert links == [('ana', 'Amazon'), ('carla', 'Shopee')]
+    assert con.execute('select fonte, count(*) from story_items group by fonte order by fonte').fetchall() == [
+        ('apify', 1), ('selenium', 2),
+    ]
+
+
+def test_stickers_por_perfil_dia(con, pasta_selenium):
+    carregar_fontes(con, [FonteSelenium(str(pasta_selenium))])
+    mencoes = stickers_por_perfil_dia(con, 'mencao').fetchall()
+    assert [(u, tipo, valor, n) for u, _, tipo, valor, n in mencoes] == [('ana', 'mencao', 'marca', 1)]
+
+
+def test_fonte_sem_lotes_falha_na_criacao():
+    class Incompleta(FonteStories):
+        nome = 'incompleta'
+
+    with pytest.raises(TypeError):
+        Incompleta()
@@ -0,0 +1,148 @@
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('selenium')
+pytest.importorskip('webdriver_manager')
+
+import instagram_daemon
+
+
+class PoolFalso:
+    """Pool com um único driver fictício, sem navegador."""
+
+    usuario_login = 'login'
+    senha_login = 'senha'
+
+    def __init__(self):
+        self.drivers = []
+        self._livres = queue.Queue()
+        self._livres.put('driver')
+
+    def livres(self):
+        return self._livres.qsize()
+
+    def obter(self, timeout=None):
+        return self._livres.get(timeout=timeout)
+
+    def devolver(self, gerenciado):
+        self._livres.put(gerenciado)
+
+
+@pytest.fixture
+def capturas(monkeypatch):
+    """Substitui a captura: 'erro' levanta exceção, 'sem_stories' falha, o resto funciona."""
+    chamadas = []
+
+    def capturar(gerenciado, username, usuario_login, senha_login, delay, output_folder):
+        chamadas.append(username)
+        if username == 'erro':
+            raise RuntimeError('navegador caiu')
+        return username != 'sem_stories'
+
+    monkeypatch.setattr(instagram_daemon, 'capturar_usuario_com_recuperacao', capturar)
+    return chamadas
+
+
+@pytest.fixture
+def daemon(tmp_path, capturas):
+    """Sobe o handler em uma porta efêmera; retorna (url, handler)."""
+    handler = type('Handler', (instagram_daemon.CapturaHandler,), {
+        'pool': PoolFalso(),
+        'output_folder': str(tmp_path),
+        'token': '',
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', handler
+    server.shutdown()
+    server.server_close()
+
+
+def requisitar(url, corpo=None, headers=None, metodo='POST'):
+    if headers is None:
+        headers = {'Content-Type': 'application/json'}
+    if corpo is not None and not isinstance(corpo, bytes):
+        corpo = json.dumps(corpo).encode('utf-8')
+    req = urllib.request.Request(url, data=corpo, headers=headers, method=metodo)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resposta:
+            return resposta.status, resposta.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_capturar_envia_uma_linha_por_username(daemon, capturas, tmp_path):
+    url, handler = daemon
+    status, corpo = requisitar(f'{url}/capturar', {'usernames': ['ana', 'sem_stories', 'erro', 'bia']})
+
+    assert status == 200
+    linhas = [json.loads(linha) for linha in corpo.decode('utf-8').splitlines()]
+    assert [(l['username'], l['sucesso']) for l in linhas] == [
+        ('ana', True), ('sem_stories', False), ('erro', False), ('bia', True),
+    ]
+    assert linhas[0]['arquivo'] == str(tmp_path / 'ana_stories.json')
+    assert linhas[1]['arquivo'] is None
+    # Um erro em um perfil vira linha de erro e não interrompe o job
+    assert linhas[2]['erro'] == 'navegador caiu'
+    assert all('duracao' in l for l in linhas)
+    assert capturas == ['ana', 'sem_stories', 'erro', 'bia']
+    # O driver volta para o pool ao fim do job
+    assert handler.pool.livres() == 1
+
+
+@pytest.mark.parametrize('corpo', [
+    b'nao e json',
+    {},
+    ['ana'],
+    {'usernames': 'ana'},
+    {'usernames': ['ana', 1]},
+    {'usernames': ['ana'], 'delay': 'x'},
+    {'usernames': ['../../etc/passwd']},
+    {'usernames': ['a' * 31]},
+])
+def test_job_invalido_responde_400(daemon, capturas, corpo):
+    url, handler = daemon
+    status, resposta = requisitar(f'{url}/capturar', corpo)
+
+    assert status == 400
+    assert json.loads(resposta)['erro'].startswith('job inválido')
+    assert capturas == []
+    assert handler.pool.livres() == 1
+
+
+@pytest.mark.parametrize('rota', ['/capturar', '/encerrar'])
+def test_post_sem_json_responde_415(daemon, capturas, rota):
+    url, _ = daemon
+    status, _ = requisitar(f'{url}{rota}', {'usernames': ['ana']}, {'Content-Type': 'text/plain'})
+
+    assert status == 415
+    assert capturas == []
+
+
+def test_token_obrigatorio_quando_configurado(daemon, capturas):
+    url, handler = daemon
+    handler.token = 'segredo'
+
+    assert requisitar(f'{url}/capturar', {'usernames': ['ana']})[0] == 401
+    assert requisitar(f'{url}/status', metodo='GET', headers={})[0] == 401
+    status, _ = requisitar(f'{url}/capturar', {'usernames': ['ana']}, {
+        'Content-Type': 'application/json',
+        'Authorization': 'Bearer segredo',
+    })
+    assert status == 200
+    assert capturas == ['ana']
+
+
+def test_status(daemon):
+    url, _ = daemon
+    status, corpo = requisitar(f'{url}/status', metodo='GET', headers={})
+
+    assert status == 200
+    assert json.loads(corpo) == {'drivers': 0, 'livres': 1, 'pids': []}
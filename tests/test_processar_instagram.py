@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+pytest.importorskip('dotenv')
+
+import processar_instagram
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def pasta_temporaria(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_upload_sem_csv_retorna_1():
+    assert processar_instagram.cli(['upload', '--data', '20000101']) == 1
+
+
+def test_upload_mantem_arquivos_se_algum_envio_falhar(pasta_temporaria, monkeypatch):
+    csv_filename, stickers_filename = processar_instagram.arquivos_saida('20000101')
+    (pasta_temporaria / csv_filename).write_text('username,origin,date\n')
+    (pasta_temporaria / stickers_filename).write_bytes(b'')
+    resultados = iter([True, False])
+    monkeypatch.setattr(processar_instagram, 'upload_to_gcs', lambda *args: next(resultados))
+
+    assert processar_instagram.cli(['upload', '--data', '20000101']) == 1
+    assert sorted(os.listdir(pasta_temporaria)) == [csv_filename, stickers_filename]
+
+    # Repetir o comando reenvia os dois arquivos e só então os remove
+    monkeypatch.setattr(processar_instagram, 'upload_to_gcs', lambda *args: True)
+    assert processar_instagram.cli(['upload', '--data', '20000101']) == 0
+    assert os.listdir(pasta_temporaria) == []
+
+
+@pytest.mark.parametrize('ok, codigo', [(True, 0), (False, 1)])
+def test_capture_retorna_codigo_da_captura(monkeypatch, ok, codigo):
+    chamadas = []
+    monkeypatch.setattr(processar_instagram, 'capturar', lambda lista, delay: chamadas.append((lista, delay)) or ok)
+
+    assert processar_instagram.cli(['capture', 'ana', 'bia', '--delay', '2']) == codigo
+    assert chamadas == [(['ana', 'bia'], 2)]
+
+
+@pytest.mark.parametrize('ok, codigo', [(True, 0), (False, 1)])
+def test_daemon_retorna_codigo_do_daemon(monkeypatch, ok, codigo):
+    falso = types.ModuleType('instagram_daemon')
+    falso.iniciar_daemon = lambda usuario_login, senha_login: ok
+    monkeypatch.setitem(sys.modules, 'instagram_daemon', falso)
+
+    assert processar_instagram.cli(['daemon']) == codigo
+
+
+def test_all_para_quando_a_captura_falha(monkeypatch):
+    monkeypatch.setattr(processar_instagram, 'ler_usernames', lambda: ['ana'])
+    monkeypatch.setattr(processar_instagram, 'capturar', lambda lista: False)
+    monkeypatch.setattr(processar_instagram, 'processar', lambda: pytest.fail('não deveria processar'))
+
+    assert processar_instagram.cli(['all']) == 1
+
+
+def executar(codigo):
+    return subprocess.run(
+        [sys.executable, '-c', codigo], cwd=RAIZ, capture_output=True, text=True, timeout=60
+    )
+
+
+def test_help_nao_importa_dependencias_pesadas():
+    resultado = executar(
+        "import sys, processar_instagram\n"
+        "try:\n"
+        "    processar_instagram.cli(['--help'])\n"
+        "except SystemExit as e:\n"
+        "    assert e.code == 0\n"
+        "print(sorted(m for m in ('duckdb', 'selenium', 'pandas', 'google.cloud') if m in sys.modules))\n"
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    assert resultado.stdout.strip().splitlines()[-1] == '[]'
+
+
+def test_excecao_no_main_sai_com_1(tmp_path):
+    # DUCKDB_THREADS inválido faz o subcomando process levantar uma exceção
+    resultado = subprocess.run(
+        [sys.executable, os.path.join(RAIZ, 'processar_instagram.py'), 'process'],
+        cwd=tmp_path, capture_output=True, text=True, timeout=60,
+        env={**os.environ, 'DUCKDB_THREADS': 'invalido'},
+    )
+    assert resultado.returncode == 1
+    assert '✗ ERRO' in resultado.stdout
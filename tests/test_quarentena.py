@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip('duckdb')
+
+from analise_stories import carregar_fontes
+from fontes_stories import FonteSelenium
+
+
+@pytest.mark.parametrize('conteudo', [
+    '{"user": {"username": "x"}, "items": [',
+    json.dumps([{'user': {'username': 'x'}, 'items': [{'taken_at': 'invalido'}]}]),
+    json.dumps([{'items': []}]),
+    json.dumps({'require': []}),
+])
+def test_selenium_invalido_vai_para_quarentena(con, pasta_selenium, conteudo):
+    invalido = pasta_selenium / 'invalido_stories.json'
+    invalido.write_text(conteudo, encoding='utf-8')
+    quarentena = []
+
+    assert carregar_fontes(con, [FonteSelenium(str(pasta_selenium))], quarentena) == 2
+    assert [(erro['arquivo'], erro['linha']) for erro in quarentena] == [(str(invalido), None)]
+
+
+def test_apify_grava_lotes_ndjson(con, fonte_apify):
+    apify = fonte_apify([{'requested': f'perfil{i}', 'stories': []} for i in range(5)], tamanho_lote=2)
+
+    assert carregar_fontes(con, [apify]) == 0
+    assert sorted(os.listdir(apify.pasta)) == [
+        'apify_teste_00000.ndjson', 'apify_teste_00001.ndjson', 'apify_teste_00002.ndjson',
+    ]
+
+
+def test_apify_isola_a_linha_invalida_do_lote(con, fonte_apify):
+    apify = fonte_apify([
+        {'requested': 'ok', 'stories': [{'pk': 1, 'taken_at': 1760000000}]},
+        {'requested': 'tipo', 'stories': [{'pk': 2, 'taken_at': 'invalido'}]},
+        {'stories': []},
+        {'requested': 'outro', 'stories': [{'pk': 3, 'taken_at': 1760000000}]},
+    ])
+    quarentena = []
+
+    assert carregar_fontes(con, [apify], quarentena) == 2
+    lote = os.path.join(apify.pasta, 'apify_teste_00000.ndjson')
+    assert [(erro['arquivo'], erro['linha']) for erro in quarentena] == [(lote, 2), (lote, 3)]
+    assert sorted(con.execute('select username from story_items').fetchall()) == [('ok',), ('outro',)]